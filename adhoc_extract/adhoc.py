@@ -4,6 +4,7 @@ import pandas as pd
 from src import project_root
 import json
 from configparser import ConfigParser
+from src.decoding import ACCEPT_ENCODING, decode_response
 
 CONFIG_FOLDER = os.path.join(project_root,'config')
 CONFIG_FILE = os.path.join(CONFIG_FOLDER,'config.ini')
@@ -75,17 +76,20 @@ if __name__ == "__main__":
                 with s as session:
                     payload['getArticles']['searchQuery'] = oemQuery
                     payload['getArticles']['page'] = page
+                    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
                     response = session.post(url=URL, params=params, json=payload)
-                    if response.status_code == 200 and len(response.json()['articles']) > 0:
-                        response_json = response.json()['articles']
+                    if response.status_code != 200:
+                        # Error bodies are not always JSON
+                        print(response.text)
+                        break
+                    # Decode the body once, the branches below reuse it
+                    response_json = decode_response(response)['articles']
+                    if len(response_json) > 0:
                         for item in response_json: item['searchQuery'] = oemQuery
                         response_list.append(response_json)
                         counter += len(response_json)
                         page += 1
-                    elif response.status_code == 200 and len(response.json()['articles']) == 0:
-                        break
                     else:
-                        print(response.json())
                         break
             except requests.RequestException as e:
                     print(f"Request failed: {e}")
@@ -3,6 +3,8 @@ import requests
 import pandas as pd
 from datetime import datetime as dt
 from configparser import ConfigParser
+from src.utils import read_excel_cached
+from src.decoding import ACCEPT_ENCODING, decode_response
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 project_root = '.'
@@ -14,7 +16,7 @@ config = ConfigParser()
 config.read(CONFIG_FILE)
 
 # Read the reference file
-oem_iam_df = pd.read_excel('adhoc_extract/OEM-IAM.xlsx', sheet_name='Sheet1')
+oem_iam_df = read_excel_cached('adhoc_extract/OEM-IAM.xlsx', sheet_name='Sheet1')
 
 print(f"Shape of the loaded dataframe {oem_iam_df.shape}\n")
 print(f"Distribution of item ids: \n{oem_iam_df['Brand'].value_counts()}")
@@ -84,15 +86,18 @@ def query_oem(oem, url, payload, params):
             with s as session:
                 payload['getArticles']['searchQuery'] = oemQuery
                 payload['getArticles']['page'] = page
+                session.headers['Accept-Encoding'] = ACCEPT_ENCODING
                 response = session.post(url=url, params=params, json=payload)
                 try:
-                    if response.status_code == 200 and len(response.json()['articles']) > 0:
-                        response_json = response.json()['articles']
+                    # Decode the body once, the branches below reuse it
+                    articles = decode_response(response)['articles'] if response.status_code == 200 else None
+                    if response.status_code == 200 and len(articles) > 0:
+                        response_json = articles
                         for item in response_json: item['searchQuery'] = oemQuery
                         response_list.append(response_json)
                         counter += len(response_json)
                         page += 1
-                    elif response.status_code == 200 and len(response.json()['articles']) == 0:
+                    elif response.status_code == 200 and len(articles) == 0:
                         break
                     else:
                         print(f"Error {response.status_code}: {response.text}")
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 
 def find_project_root(current_path):
     # Traverse up until you find a directory with a 'config' directory
@@ -10,7 +11,14 @@ def find_project_root(current_path):
         current_path = parent
     return current_path
 
-# Determine the project root when the package is first imported
-project_root = find_project_root(os.path.abspath(os.path.dirname(__file__)))
+@lru_cache(maxsize=None)
+def get_project_root():
+    return find_project_root(os.path.abspath(os.path.dirname(__file__)))
+
+def __getattr__(name):
+    # Determine the project root lazily, the first time 'project_root' is accessed
+    if name == 'project_root':
+        return get_project_root()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # You can then use 'project_root' within the package to construct paths to resources
@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src import project_root
+from src.slowder import DataLoader
+from src.logger_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = os.path.join(project_root, 'config', 'default.ini')
+BASELINE_FILE = os.path.join(project_root, 'data', 'benchmarks', 'baseline.json')
+
+# Larger sizes (e.g. --rows 1000000) are opt in, the traced memory run makes them slow
+DEFAULT_ROWS = [10_000, 100_000]
+
+
+def oem_matches_frame(rows, rng):
+    """
+    Frame shaped like the data/oem_matches extracts
+    """
+    mfr_ids = rng.integers(1, 300, rows)
+    supplier_ids = rng.integers(1, 500, rows)
+    generic_ids = rng.integers(1, 5000, rows)
+    generic_desc = np.array(['Filter, cabin air', 'Oil Filter', 'Brake Pad Set, disc brake',
+                             'Mounting, control/trailing arm', 'Dust Cover Kit, shock absorber'])
+    mfr_names = np.array(['HYUNDAI', 'TOYOTA', 'MERCEDES-BENZ', 'MAZDA', 'NISSAN', 'KIA'])
+    supplier_names = np.array(['HENGST FILTER', 'CORTECO', 'BOGE', 'BOSCH', 'MANN-FILTER'])
+    return pd.DataFrame({
+        'matchType': 'OENumber',
+        'description': 'OE Number',
+        'match': pd.Series(rng.integers(10**9, 10**10, rows)).astype(str).str.slice(0, 5) + '-' + pd.Series(rng.integers(10**4, 10**5, rows)).astype(str),
+        'mfrId': mfr_ids.astype(float),
+        'mfrName': mfr_names[mfr_ids % len(mfr_names)],
+        'part_dataSupplierId': supplier_ids,
+        'part_articleNumber': pd.Series(rng.integers(10**6, 10**8, rows)).astype(str),
+        'part_mfrName': supplier_names[supplier_ids % len(supplier_names)],
+        'genericArticleId': generic_ids.astype(float),
+        'genericArticleDescription': generic_desc[generic_ids % len(generic_desc)],
+        'legacyArticleId': rng.integers(10**7, 10**9, rows).astype(float),
+        'OEM SKU': pd.Series(rng.integers(10**5, 10**6, rows)).astype(str).radd('A'),
+    })
+
+
+def gasp_master_frame(rows, rng, width=40):
+    """
+    Wide frame shaped like the GASP master sheet: mostly text columns with some numbers
+    """
+    data = {}
+    for i in range(width):
+        if i % 4 == 0:
+            data[f'Price {i}'] = rng.random(rows) * 1000
+        elif i % 4 == 1:
+            data[f'Qty {i}'] = rng.integers(0, 100, rows)
+        else:
+            values = np.array([f'Value {j}\twith "quotes"\n' if j % 7 == 0 else f'Value {j}' for j in range(50)])
+            data[f'Attribute {i}'] = values[rng.integers(0, len(values), rows)]
+    return pd.DataFrame(data)
+
+
+def mixed_types_frame(rows, rng):
+    """
+    Object columns mixing strings, numbers and missing values
+    """
+    mixed = np.empty(rows, dtype=object)
+    choice = rng.integers(0, 3, rows)
+    mixed[choice == 0] = 'text'
+    mixed[choice == 1] = 42
+    mixed[choice == 2] = None
+    return pd.DataFrame({
+        'mixed_a': mixed,
+        'mixed_b': np.roll(mixed, 1),
+        'numbers': rng.random(rows),
+        'labels': np.where(choice == 0, 'a', 'b'),
+    })
+
+
+def datetime_frame(rows, rng, width=6):
+    """
+    Datetime heavy frame with missing timestamps
+    """
+    base = np.datetime64('2024-01-01')
+    data = {}
+    for i in range(width):
+        values = base + rng.integers(0, 10**9, rows).astype('timedelta64[s]')
+        series = pd.Series(values)
+        series[rng.random(rows) < 0.1] = pd.NaT
+        data[f'timestamp_{i}'] = series
+    data['id'] = np.arange(rows)
+    return pd.DataFrame(data)
+
+
+SCENARIOS = {
+    'oem_matches': oem_matches_frame,
+    'gasp_master': gasp_master_frame,
+    'mixed_types': mixed_types_frame,
+    'datetimes': datetime_frame,
+}
+
+
+def measure(func, make_args=tuple):
+    """
+    Run func on fresh arguments from make_args twice: untraced for the time and under
+    tracemalloc for the peak memory, whose tracing overhead would swamp the timing.
+    Returns (result of the timed run, seconds, peak memory in MB)
+    """
+    args = make_args()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+
+    args = make_args()
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 ** 2
+
+
+def run_scenario(loader, name, rows, work_dir, seed=0):
+    """
+    Time each DataLoader preprocessing stage on one synthetic frame
+    """
+    rng = np.random.default_rng(seed)
+    df = SCENARIOS[name](rows, rng)
+    results = {}
+
+    input_dir = os.path.join(work_dir, 'input')
+    stage_dir = os.path.join(work_dir, 'stage')
+    os.makedirs(input_dir, exist_ok=True)
+    os.makedirs(stage_dir, exist_ok=True)
+    df.to_csv(os.path.join(input_dir, f'{name}.csv'), index=False)
+
+    # Stages modifying their input get a fresh copy for each of the two runs
+    cleaned, results['clean'], results['clean_peak_mb'] = measure(loader.clean, lambda: (df.copy(),))
+    _, results['generate_col_definitions'], results['generate_col_definitions_peak_mb'] = measure(loader.generate_col_definitions, lambda: (cleaned,))
+    _, results['local_stage_df'], results['local_stage_df_peak_mb'] = measure(loader.local_stage_df, lambda: (cleaned.copy(), os.path.join(stage_dir, f'{name}.csv')))
+    shutil.rmtree(stage_dir)
+    os.makedirs(stage_dir)
+    _, results['process_flat_files'], results['process_flat_files_peak_mb'] = measure(loader.process_flat_files, lambda: (input_dir, stage_dir))
+
+    shutil.rmtree(input_dir)
+    shutil.rmtree(stage_dir)
+    return results
+
+
+def compare_to_baseline(report, baseline, tolerance, min_slowdown=0.05):
+    """
+    Return the list of stages slower than baseline * (1 + tolerance), ignoring
+    differences below min_slowdown seconds which are timer noise
+    """
+    regressions = []
+    for key, stages in report.items():
+        for stage, value in stages.items():
+            if stage.endswith('_peak_mb'):
+                continue
+            reference = baseline.get(key, {}).get(stage)
+            if reference is not None and value > reference * (1 + tolerance) and value - reference > min_slowdown:
+                regressions.append(f"{key} {stage}: {value:.3f}s vs baseline {reference:.3f}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DataLoader preprocessing on synthetic data")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown relative to baseline")
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    # No Snowflake connection is opened, the preprocessing stages run locally
+    loader = DataLoader(config_path=CONFIG_FILE)
+    report = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in args.scenarios:
+            for rows in args.rows:
+                key = f"{name}/{rows}"
+                report[key] = run_scenario(loader, name, rows, work_dir)
+                timings = ', '.join(f"{stage} {value:.3f}" for stage, value in report[key].items())
+                print(f"{key}: {timings}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(report, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    benchmark_logger = setup_logging("benchmark")
+    logging.getLogger('src.slowder').setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import re
+import logging
+import argparse
+import pandas as pd
+from src import project_root
+from datetime import datetime as dt
+from src.logger_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DATA_STAGE_LOCATION = os.path.join(project_root, 'data')
+
+# Columns identifying a single observation for each output folder
+DEDUP_KEYS = {
+    'oem_matches': ['OEM SKU', 'part_dataSupplierId', 'part_articleNumber'],
+    'no_responses': ['OEM SKU'],
+}
+
+# Target columns written by multi-target extracts, part of the key when present.
+# Rows from extracts made before targets were tagged all came from the AE market
+LEGACY_TARGET = {'articleCountry': 'AE', 'provider': '22610', 'searchType': '1'}
+
+# Leftover pandas index columns written by older extracts
+INDEX_COLUMNS = ['index', 'Unnamed: 0']
+
+STAMP_PATTERN = re.compile(r'_(\d{8}_\d{6})')
+
+
+def observation_time(file_path):
+    """
+    Timestamp of an extract file from the stamp written by save_to_csv, or None for
+    the legacy unstamped extracts. File mtimes are not used, a clone or copy resets them.
+    """
+    match = STAMP_PATTERN.search(os.path.basename(file_path))
+    if match:
+        return dt.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    return None
+
+
+def list_csv_files(folder_path):
+    """
+    CSV files of a folder ordered from oldest to latest observation. Unstamped files
+    predate the timestamped reruns and are ordered before all of them.
+    """
+    files = [os.path.join(folder_path, f) for f in os.listdir(folder_path)
+             if f.endswith('.csv') and os.path.isfile(os.path.join(folder_path, f))]
+
+    def sort_key(file_path):
+        stamp = observation_time(file_path)
+        return (stamp is not None, stamp or dt.min, file_path)
+
+    return sorted(files, key=sort_key)
+
+
+def compact_folder(file_type, folder_path=None, max_rows=1_000_000, delete_sources=False):
+    """
+    Merge all CSV extracts of a folder into a few large, de-duplicated and sorted files,
+    keeping the latest observation per key in DEDUP_KEYS. The merged sources are moved
+    to the archive subfolder, or deleted, so loads of the folder only see compacted data.
+    """
+    folder_path = folder_path or os.path.join(DATA_STAGE_LOCATION, file_type)
+    keys = DEDUP_KEYS[file_type]
+
+    source_files = list_csv_files(folder_path)
+    if len(source_files) < 2:
+        logger.info(f"Nothing to compact in {folder_path}")
+        return []
+
+    frames = []
+    for order, file_path in enumerate(source_files):
+        try:
+            df = pd.read_csv(file_path, dtype=str, keep_default_na=False, na_values=[''])
+        except pd.errors.EmptyDataError:
+            continue
+        df = df.drop(columns=[c for c in INDEX_COLUMNS if c in df.columns])
+        df['_order'] = order
+        frames.append(df)
+
+    if not frames:
+        logger.info(f"Nothing to compact in {folder_path}")
+        return []
+
+    merged = pd.concat(frames, ignore_index=True)
+    rows_in = len(merged)
+    target_columns = [c for c in LEGACY_TARGET if c in merged.columns]
+    if target_columns:
+        merged = merged.fillna({c: LEGACY_TARGET[c] for c in target_columns})
+        keys = keys + target_columns
+
+    # Later files win; a stable sort keeps the original row order within a file
+    merged = merged.sort_values('_order', kind='stable')
+    # Generic article rows without a matched part have an incomplete key, NaN key parts
+    # would compare equal, so those rows are only de-duplicated on the full row
+    complete = merged[keys].notna().all(axis=1)
+    merged = pd.concat([
+        merged[complete].drop_duplicates(subset=keys, keep='last'),
+        merged[~complete].drop_duplicates(subset=[c for c in merged.columns if c != '_order'], keep='last'),
+    ])
+    merged = merged.drop(columns='_order').sort_values(keys, kind='stable').reset_index(drop=True)
+
+    dt_stamp = dt.now().strftime("%Y%m%d_%H%M%S")
+    output_files = []
+    for part, start in enumerate(range(0, len(merged), max_rows)):
+        file_path = os.path.join(folder_path, f"{file_type}_compacted_{dt_stamp}_{part}.csv")
+        merged.iloc[start:start + max_rows].to_csv(file_path, index=False)
+        output_files.append(file_path)
+
+    archive_path = os.path.join(folder_path, 'archive')
+    os.makedirs(archive_path, exist_ok=True)
+    for file_path in source_files:
+        if delete_sources:
+            os.remove(file_path)
+        else:
+            os.replace(file_path, os.path.join(archive_path, os.path.basename(file_path)))
+
+    logger.info(f"Compacted {len(source_files)} files ({rows_in} rows) in {folder_path} "
+                f"into {len(output_files)} files ({len(merged)} rows)")
+    return output_files
+
+
+if __name__ == "__main__":
+    compaction_logger = setup_logging("compaction")
+
+    parser = argparse.ArgumentParser(description="Compact extract folders into de-duplicated files")
+    parser.add_argument('--delete-sources', action='store_true', help="remove the merged source files instead of archiving them")
+    args = parser.parse_args()
+
+    for file_type in DEDUP_KEYS:
+        compact_folder(file_type, delete_sources=args.delete_sources)
@@ -0,0 +1,64 @@
+import json
+import logging
+import threading
+import requests
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes br responses when brotli is installed
+    ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+logger = logging.getLogger(__name__)
+
+
+def decode_response(response):
+    """
+    Parse a response body exactly once, with orjson when it is installed. A body that is
+    not valid JSON raises requests.exceptions.JSONDecodeError, like response.json(), so
+    callers handling requests.RequestException treat it as a failed request.
+    """
+    try:
+        return loads(response.content)
+    except ValueError as e:
+        raise requests.exceptions.JSONDecodeError(getattr(e, 'msg', str(e)), response.text, getattr(e, 'pos', 0)) from e
+
+
+def wire_bytes(response):
+    """
+    Bytes received on the wire for a response, before decompression
+    """
+    try:
+        return response.raw.tell()
+    except (AttributeError, ValueError):
+        return int(response.headers.get('Content-Length', len(response.content)))
+
+
+class TransferStats:
+    """
+    Thread safe totals of responses, bytes on the wire and decoded bytes
+    """
+    def __init__(self):
+        self.responses = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, response):
+        received = wire_bytes(response)
+        with self._lock:
+            self.responses += 1
+            self.wire_bytes += received
+            self.decoded_bytes += len(response.content)
+        return received
+
+    def log(self):
+        ratio = self.decoded_bytes / self.wire_bytes if self.wire_bytes else 0
+        logger.info(f"{self.responses} responses, {self.wire_bytes} bytes on the wire, "
+                    f"{self.decoded_bytes} bytes decoded (compression ratio {ratio:.1f})")
@@ -0,0 +1,101 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+LISTINGS_TABLE = 'buyparts24_prod_dwh.raw_mongo.bp24_listings'
+MATCHES_TABLE = 'BUYPARTS24_PROD_DWH.ADS.CUST_DM_OEM_AM_MATCHES'
+
+
+class SkuDelta:
+    """
+    Incremental detection of new OEM SKUs using a persisted high-watermark on the listings
+    table plus a local set of already processed SKUs, so each run only reads changed listings
+    """
+    def __init__(self, state_path, watermark_column='updatedAt'):
+        self.state_path = state_path
+        self.watermark_column = watermark_column
+        self.watermark = None
+        self.processed = set()
+        self.retry = set()
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.watermark = state.get('watermark')
+            self.processed = set(state.get('processed_skus', []))
+            self.retry = set(state.get('retry_skus', []))
+            logger.info(f"Loaded delta state: watermark {self.watermark}, {len(self.processed)} processed SKUs, "
+                        f"{len(self.retry)} SKUs to retry")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'watermark': self.watermark, 'processed_skus': sorted(self.processed),
+                       'retry_skus': sorted(self.retry)}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def bootstrap(self, loader):
+        """
+        Seed the processed set from the matches table; only needed on the first run
+        """
+        sfqid = loader.execute_query(query=f'SELECT DISTINCT "oem_sku_code" FROM {MATCHES_TABLE}')
+        rows, _ = loader.get_table_result_from_cur(qid=sfqid)
+        self.processed = set(row[0] for row in rows)
+        logger.info(f"Bootstrapped delta state with {len(self.processed)} processed SKUs")
+
+    def changed_listings_query(self):
+        """
+        Query and bound parameters for the listings changed since the watermark. The bound is
+        inclusive, listings written with the watermark's own timestamp after the last run are
+        read again; the processed set drops those that were already extracted.
+        """
+        query = f"""
+            SELECT
+                "partSKU",
+                MAX("{self.watermark_column}")
+            FROM {LISTINGS_TABLE}
+            WHERE "isDeleted" in (NULL, FALSE)
+            AND "hide" in (NULL, FALSE)
+        """
+        params = None
+        if self.watermark is not None:
+            query += f"""AND "{self.watermark_column}" >= %s
+        """
+            params = (self.watermark,)
+        return query + 'GROUP BY "partSKU"', params
+
+    def get_new_skus(self, loader):
+        """
+        Return the new SKUs, including those that failed on earlier runs, and the
+        watermark to commit once they have been processed
+        """
+        if self.watermark is None and not self.processed:
+            self.bootstrap(loader)
+
+        query, params = self.changed_listings_query()
+        sfqid = loader.execute_query(query=query, params=params)
+        rows, _ = loader.get_table_result_from_cur(qid=sfqid)
+
+        watermarks = [row[1] for row in rows if row[1] is not None]
+        new_watermark = str(max(watermarks)) if watermarks else self.watermark
+        new_skus = [row[0] for row in rows if row[0] not in self.processed]
+        # Failed SKUs are behind the watermark already, so they are carried over explicitly
+        new_skus += sorted(self.retry.difference(new_skus, self.processed))
+        logger.info(f"{len(rows)} changed listings since watermark {self.watermark}, {len(new_skus)} new SKUs "
+                    f"({len(self.retry)} retried)")
+        return new_skus, new_watermark
+
+    def commit(self, skus, watermark, failed_skus=()):
+        """
+        Record SKUs as processed and advance the watermark; failed SKUs are kept for the next run
+        """
+        failed_skus = set(failed_skus)
+        self.processed.update(sku for sku in skus if sku not in failed_skus)
+        self.retry = failed_skus
+        self.watermark = watermark
+        self.save()
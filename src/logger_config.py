@@ -1,34 +1,181 @@
+import copy
+import json
+import time
+import queue
+import atexit
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import threading
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 
-def setup_logging(name):
+_listener = None
+_rate_limit = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `burst` error records per status code within each `window` seconds.
+    Suppressed records are counted; once a window is over the counts are reported on the
+    next record let through, and whatever is left is reported by drain() at shutdown.
+    """
+    def __init__(self, burst=5, window=60):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._state = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # The same filter is shared by several handlers; decide once per record
+        if not hasattr(record, '_rate_limit_passed'):
+            record._rate_limit_passed = self._check(record)
+        return record._rate_limit_passed
+
+    def _check(self, record):
+        status_code = getattr(record, 'status_code', None)
+        limited = status_code is not None and record.levelno >= logging.ERROR
+
+        now = time.monotonic()
+        with self._lock:
+            self._rollover(now)
+            if limited:
+                window_start, seen, suppressed = self._state.get(status_code, (now, 0, 0))
+                if seen >= self.burst:
+                    self._state[status_code] = (window_start, seen, suppressed + 1)
+                    return False
+                self._state[status_code] = (window_start, seen + 1, suppressed)
+            pending, self._pending = self._pending, {}
+
+        if pending:
+            record.msg = f"{record.msg} ({self.summary(pending)})"
+        return True
+
+    def _rollover(self, now, force=False):
+        # Move the counts of finished windows to the pending report
+        for status_code, (window_start, seen, suppressed) in list(self._state.items()):
+            if force or now - window_start >= self.window:
+                if suppressed:
+                    self._pending[status_code] = self._pending.get(status_code, 0) + suppressed
+                del self._state[status_code]
+
+    def drain(self):
+        """
+        Return and reset all suppressed counts, including those of running windows
+        """
+        with self._lock:
+            self._rollover(time.monotonic(), force=True)
+            pending, self._pending = self._pending, {}
+        return pending
+
+    @staticmethod
+    def summary(pending):
+        return ', '.join(f"{count} similar records with status {status_code} suppressed" for status_code, count in pending.items())
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    QueueHandler keeping the traceback apart from the message. The stock prepare() folds
+    it into msg, so the listener's formatters could not place it themselves.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # exc_info holds frames that cannot cross the queue, the formatted text can
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as single line JSON objects
+    """
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'name': record.name,
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        status_code = getattr(record, 'status_code', None)
+        if status_code is not None:
+            entry['status_code'] = status_code
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Records from the queue carry the traceback already formatted
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def stop_logging():
+    """
+    Flush queued records and stop the background listener, if running
+    """
+    global _listener, _rate_limit
+    if _listener is not None:
+        _listener.stop()
+        # Report records suppressed since the last one that got through
+        pending = _rate_limit.drain()
+        if pending:
+            record = logging.LogRecord(__name__, logging.WARNING, __file__, 0, _rate_limit.summary(pending), None, None)
+            for handler in _listener.handlers:
+                handler.handle(record)
+        _listener = None
+        _rate_limit = None
+
+
+def setup_logging(name, queued=False, json_format=False):
     """
     Setup logger for a specific module with log rotation.
+
+    With queued=True records are put on a queue and written by a background listener
+    thread, so worker threads never wait on the file or console handlers. Repeated error
+    records carrying a `status_code` are rate limited, and json_format=True writes the
+    log file as JSON lines.
     """
     logger = logging.getLogger(name)
-    
+
     if not logger.hasHandlers():
         # Define the log format
         log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
-        
+        if json_format:
+            log_format = JsonFormatter(datefmt='%m/%d/%Y %I:%M:%S %p')
+
         # Define the TimedRotatingFileHandler
         file_handler = TimedRotatingFileHandler('app.log', when='D', interval=1, backupCount=6)
         file_handler.setFormatter(log_format)
         file_handler.setLevel(logging.INFO)
-        
+
         # Define the console handler
         console = logging.StreamHandler()
         console.setLevel(logging.INFO)
         console.setFormatter(logging.Formatter('%(name)s - %(levelname)s - %(message)s'))
-        
+
         # Add handlers to the root logger
         root_logger = logging.getLogger('')
         root_logger.setLevel(logging.INFO)
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(console)
-    
+
+        if queued:
+            global _listener, _rate_limit
+            rate_limit = _rate_limit = RateLimitFilter()
+            file_handler.addFilter(rate_limit)
+            console.addFilter(rate_limit)
+
+            log_queue = queue.SimpleQueue()
+            root_logger.addHandler(TracebackQueueHandler(log_queue))
+            _listener = QueueListener(log_queue, file_handler, console, respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_logging)
+        else:
+            root_logger.addHandler(file_handler)
+            root_logger.addHandler(console)
+
     # Specific adjustments for Snowflake connector logs
     if name.startswith('snowflake.connector'):
         logger.setLevel(logging.WARNING)
-    
-    return logger
\ No newline at end of file
+
+    return logger
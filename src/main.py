@@ -1,52 +1,170 @@
 import os
-from src import project_root
-from src.slowder import DataLoader
+from configparser import ConfigParser
 from src.logger_config import setup_logging
-from src.techdocpull_mt import extract_data_from_api
 
-CONFIG_FOLDER = os.path.join(project_root,'config')
-CONFIG_FILE = os.path.join(CONFIG_FOLDER,'config.ini')
+main_logger = setup_logging("main", queued=True)
 
-main_logger = setup_logging("main")
+# Get difference of items between Mapping file and listing document
+NEW_SKUS_QUERY = """
+    SELECT DISTINCT
+        "partSKU"
+    FROM buyparts24_prod_dwh.raw_mongo.bp24_listings
+    WHERE "partSKU" NOT IN (SELECT DISTINCT
+                                "oem_sku_code"
+                            FROM BUYPARTS24_PROD_DWH.ADS.CUST_DM_OEM_AM_MATCHES)
+    AND "isDeleted" in (NULL, FALSE)
+    AND "hide" in (NULL, FALSE)
+"""
 
-if __name__ == "__main__":
-    main_logger.info("Starting application")
+# Every listed SKU, extracted once for targets added to the config
+LISTED_SKUS_QUERY = """
+    SELECT DISTINCT
+        "partSKU"
+    FROM buyparts24_prod_dwh.raw_mongo.bp24_listings
+    WHERE "isDeleted" in (NULL, FALSE)
+    AND "hide" in (NULL, FALSE)
+"""
 
-    # Initialize Data Load API for Snowflake
-    loader = DataLoader(config_path=CONFIG_FILE)
 
-    # Get difference of items between Mapping file and listing document
-    sql_query = """
-        SELECT DISTINCT 
-            "partSKU"
-        FROM buyparts24_prod_dwh.raw_mongo.bp24_listings
-        WHERE "partSKU" NOT IN (SELECT DISTINCT 
-                                    "oem_sku_code"
-                                FROM BUYPARTS24_PROD_DWH.ADS.CUST_DM_OEM_AM_MATCHES)
-        AND "isDeleted" in (NULL, FALSE)
-        AND "hide" in (NULL, FALSE)
+def get_new_oem_skus(loader):
     """
-    sfqid = loader.execute_query(query=sql_query)
+    Cheap delta check: OEM SKUs listed but not yet mapped
+    """
+    sfqid = loader.execute_query(query=NEW_SKUS_QUERY)
+    oem_skus, _ = loader.get_table_result_from_cur(qid=sfqid)
+    return list(map(lambda x:x[0], oem_skus))
 
+
+def get_listed_skus(loader):
+    """
+    All OEM SKUs currently listed
+    """
+    sfqid = loader.execute_query(query=LISTED_SKUS_QUERY)
     oem_skus, _ = loader.get_table_result_from_cur(qid=sfqid)
+    return list(map(lambda x:x[0], oem_skus))
+
+
+def distribute_extraction(oem_skus, config, targets=None):
+    """
+    Coordinator side of the work queue: enqueue SKU chunks and wait until the
+    workers (python -m src.workqueue worker) have extracted all of them; returns the
+    SKUs that failed inside completed chunks, or None if whole chunks failed
+    """
+    from src.workqueue import WorkQueue, DEFAULT_DB_PATH
+
+    queue = WorkQueue(
+        db_path=config.get('workqueue', 'db_path', fallback=DEFAULT_DB_PATH) or DEFAULT_DB_PATH,
+        lease_seconds=config.getfloat('workqueue', 'lease_seconds', fallback=1800),
+    )
+    first_id = queue.enqueue(oem_skus, chunk_size=config.getint('workqueue', 'chunk_size', fallback=1000), targets=targets)
+    counts = queue.wait_until_drained(min_id=first_id)
+    if counts.get('failed'):
+        main_logger.error(f"{counts['failed']} chunks failed in the work queue")
+        return None
+    return queue.failed_skus(min_id=first_id)
+
+
+def extract(oem_skus, targets, config, config_file):
+    """
+    Extract the SKUs for the targets, locally or through the work queue; returns the SKUs
+    that failed, or None if the extraction as a whole failed
+    """
+    if config.getboolean('workqueue', 'enabled', fallback=False):
+        return distribute_extraction(oem_skus, config, targets)
+
+    from src.techdocpull_mt import extract_data_from_api
 
-    oem_skus = list(map(lambda x:x[0], oem_skus))
+    # extract IAM via API call for the difference skus
+    return extract_data_from_api(oem_list=oem_skus, config_path=config_file, targets=targets)
 
-    # If new oems exists enter the work flow
-    if len(oem_skus) > 0:
-        # extract IAM via API call for the difference skus
-        main_logger.info(f"{oem_skus} new SKUs detected")
-        if extract_data_from_api(oem_list=oem_skus, config_path=CONFIG_FILE):
+
+def main():
+    # Heavy modules are imported only once they are needed, so runs without new SKUs stay cheap
+    from src import project_root
+    from src.slowder import DataLoader
+
+    config_file = os.path.join(project_root, 'config', 'config.ini')
+    config = ConfigParser()
+    config.read(config_file)
+
+    main_logger.info("Starting application")
+
+    # Optional watermark based delta detection instead of the full anti-join
+    delta = None
+    if config.getboolean('delta', 'enabled', fallback=False):
+        from src.delta import SkuDelta
+        delta = SkuDelta(
+            state_path=os.path.join(project_root, 'data', 'state', 'sku_delta.json'),
+            watermark_column=config.get('delta', 'watermark_column', fallback='updatedAt'),
+        )
+
+    # New SKU detection does not know about targets; targets added to the config are
+    # backfilled once with every listed SKU
+    from src.targets import DEFAULT_TARGETS, TargetBackfill, parse_targets
+    targets = parse_targets(config.get('techdoc', 'targets', fallback='')) or DEFAULT_TARGETS
+    backfill = TargetBackfill(state_path=os.path.join(project_root, 'data', 'state', 'targets.json'))
+    current_targets = [target for target in targets if backfill.is_completed(target)]
+
+    # Initialize Data Load API for Snowflake
+    with DataLoader(config_path=config_file) as loader:
+        if delta is not None:
+            oem_skus, watermark = delta.get_new_skus(loader)
+        else:
+            oem_skus = get_new_oem_skus(loader)
+
+        pending_targets = backfill.pending(targets)
+        new_targets = [target for target in pending_targets if not backfill.is_completed(target)]
+        listed_skus = get_listed_skus(loader) if new_targets else []
+        backfill_jobs = []
+        for target in pending_targets:
+            skus = backfill.skus_for(target, listed_skus)
+            if skus:
+                main_logger.info(f"Backfilling target {target} with {len(skus)} SKUs")
+                backfill_jobs.append((target, skus))
+
+        extract_new = len(oem_skus) > 0 and len(current_targets) > 0
+        if not extract_new and not backfill_jobs:
+            main_logger.info("No New OEM SKUs detected")
+            if delta is not None:
+                delta.commit(oem_skus, watermark)
+            return
+
+        # If new oems exists enter the work flow
+        failed_skus = []
+        if extract_new:
+            main_logger.info(f"{oem_skus} new SKUs detected")
+            failed_skus = extract(oem_skus, current_targets, config, config_file)
+
+        backfill_failed = {}
+        for target, skus in backfill_jobs:
+            if failed_skus is None:
+                break
+            backfill_failed[target] = extract(skus, [target], config, config_file)
+            if backfill_failed[target] is None:
+                failed_skus = None
+
+        # Extracts land in the project data folder, or on the shared mount when workers write them
+        extract_location = os.path.join(project_root, 'data')
+        if config.getboolean('workqueue', 'enabled', fallback=False):
+            extract_location = config.get('workqueue', 'output_dir', fallback='') or extract_location
+
+        if failed_skus is not None:
             main_logger.info("Extrated dataset")
-            loader.main_load(name= 'CUST_DATA_OEM_NO_MATCHES', input_location=os.path.join(project_root,'data','no_responses'), staging_location=os.path.join(project_root,'data','upload_stage'))
-            loader.main_load(name= 'CUST_DATA_OEM_MATCHES', input_location=os.path.join(project_root,'data','oem_matches'), staging_location=os.path.join(project_root,'data','upload_stage'))
+            loader.main_load(name= 'CUST_DATA_OEM_NO_MATCHES', input_location=os.path.join(extract_location,'no_responses'), staging_location=os.path.join(project_root,'data','upload_stage'))
+            loader.main_load(name= 'CUST_DATA_OEM_MATCHES', input_location=os.path.join(extract_location,'oem_matches'), staging_location=os.path.join(project_root,'data','upload_stage'))
+            if delta is not None:
+                # Failed SKUs are not marked as processed so the next run retries them
+                delta.commit(oem_skus, watermark, failed_skus)
+            for target, target_failed in backfill_failed.items():
+                backfill.commit(target, target_failed)
         else:
             main_logger.error("Issue with the data extract. Please check logs")
-    else:
-        main_logger.info("No New OEM SKUs detected")
 
     # # gasp_master = True
 
     # # if gasp_master:
     # #     loader.main_load(name='cust_data_oem_gasp_matches_v2', input_location=os.path.join(project_root,'data','gasp_master'), staging_location=os.path.join(project_root,'data','upload_stage'))
 
+
+if __name__ == "__main__":
+    main()
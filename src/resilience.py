@@ -0,0 +1,173 @@
+import time
+import logging
+import threading
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """
+    Rolling window of request latencies (seconds) shared across worker threads
+    """
+    def __init__(self, window=1000, min_samples=20):
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, p):
+        """
+        Latency at percentile p (0-100), or None until enough samples are collected
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    Pause dispatch for `cooldown` seconds after `failure_threshold` consecutive failures.
+    Once the cooldown is over calls go through again; another failure re-opens the circuit.
+    """
+    def __init__(self, failure_threshold=5, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block the calling thread while the circuit is open
+        """
+        while True:
+            with self._lock:
+                remaining = self._open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold and time.monotonic() >= self._open_until:
+                self._open_until = time.monotonic() + self.cooldown
+                logger.warning(f"Circuit opened after {self._failures} consecutive failures, pausing dispatch for {self.cooldown}s")
+
+
+class HedgedPoster:
+    """
+    Issue POST requests with a timeout, sending a duplicate (hedged) request when the first
+    one is slower than the given latency percentile and returning whichever answers first.
+
+    Every attempt runs on a pool thread with that thread's own session, so an attempt that
+    lost the race keeps no session shared with later requests. The pool holds two threads
+    per caller and hedges are only sent while the extra half is free, so orphaned attempts
+    still running until their timeout never make primaries queue.
+    """
+    def __init__(self, timeout=30, hedge_percentile=95, min_hedge_delay=1.0, callers=10,
+                 failure_threshold=5, cooldown=30, headers=None):
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.headers = headers or {}
+        self.callers = callers
+        self.pool_size = 2 * callers
+        self.tracker = LatencyTracker()
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, cooldown=cooldown)
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='hedge')
+        self._local = threading.local()
+        self._in_flight = 0
+        self._active_calls = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _session(self):
+        # One session per pool thread, connections are reused across that thread's attempts
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            self._local.session.headers.update(self.headers)
+        return self._local.session
+
+    def _submit(self, url, params, json):
+        with self._lock:
+            self._in_flight += 1
+        return self.executor.submit(self._timed_post, url, params, json)
+
+    def _timed_post(self, url, params, json):
+        try:
+            start = time.monotonic()
+            response = self._session().post(url=url, params=params, json=json, timeout=self.timeout)
+            self.tracker.record(time.monotonic() - start)
+            return response
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _can_hedge(self):
+        # Attempts beyond the primaries of the calls in progress are hedges or orphans;
+        # keep them within the half of the pool not reserved for primaries
+        with self._lock:
+            return self._in_flight - self._active_calls < self.pool_size - self.callers
+
+    def _hedge_delay(self):
+        latency = self.tracker.percentile(self.hedge_percentile)
+        if latency is None:
+            return None
+        return max(latency, self.min_hedge_delay)
+
+    def post(self, url, params, json):
+        """
+        POST the request; raises requests.RequestException if every attempt failed
+        """
+        self.breaker.wait()
+
+        with self._lock:
+            self._active_calls += 1
+        try:
+            return self._post(url, params, json)
+        finally:
+            with self._lock:
+                self._active_calls -= 1
+
+    def _post(self, url, params, json):
+        futures = [self._submit(url, params, json)]
+        delay = self._hedge_delay()
+        if delay is not None:
+            done, _ = wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done and self._can_hedge():
+                futures.append(self._submit(url, params, json))
+
+        error = None
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except requests.RequestException as e:
+                error = e
+                continue
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+        self.breaker.record_failure()
+        raise error
@@ -0,0 +1,63 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Types a column can be widened to, from narrowest to widest
+NUMERIC_WIDENING = ['NUMBER', 'FLOAT']
+
+
+def widen_type(current, new):
+    """
+    Narrowest Snowflake type holding the values of both types: NUMBER -> FLOAT -> TEXT
+    """
+    if current is None or current == new:
+        return new
+    if current in NUMERIC_WIDENING and new in NUMERIC_WIDENING:
+        return max(current, new, key=NUMERIC_WIDENING.index)
+    return 'TEXT'
+
+
+class SchemaRegistry:
+    """
+    Persisted column types per Snowflake table, so known tables keep their schema
+    between runs. Types are only ever widened, never narrowed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.tables = {}
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.tables = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.tables, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, table_name):
+        """
+        Column name to Snowflake type mapping of a table, in column order
+        """
+        return dict(self.tables.get(table_name, {}))
+
+    def update(self, table_name, column_types):
+        """
+        Record new columns of a table and widen existing ones; returns the changed columns
+        """
+        columns = self.tables.setdefault(table_name, {})
+        changed = {}
+        for column, data_type in column_types.items():
+            widened = widen_type(columns.get(column), data_type)
+            if widened != columns.get(column):
+                changed[column] = columns[column] = widened
+        if changed:
+            logger.info(f"Schema registry: recorded {changed} for {table_name}")
+            self.save()
+        return changed
@@ -1,15 +1,20 @@
 import os
+import re
 import csv
 import logging
 import configparser
-import pandas as pd
-import snowflake.connector
+from src import project_root
+from src.schema_registry import SchemaRegistry, widen_type
 # from urllib.parse import quote
 # import openpyxl
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Literal "\\t", "\\n", "\\r" sequences, the actual control characters and double quotes
+SPECIAL_CHARACTERS = r'\\t|\\n|\\r|[\t\n\r"]'
+
+
 class DataLoader:
     def __init__(self, config_path):
         config = configparser.ConfigParser()
@@ -19,6 +24,10 @@ class DataLoader:
         self.sentinel_value = config.get('defaults', 'sentinel_value', fallback="0001-01-01 00:00:00.000")
         self.datetime_format = config.get('defaults', 'datetime_format', fallback="%Y-%m-%d %H:%M:%S.%f")
 
+        # Column types of previously loaded tables
+        self.schema_registry = SchemaRegistry(config.get('defaults', 'schema_registry',
+            fallback=os.path.join(project_root, 'data', 'state', 'schema_registry.json')))
+
         # Snowflake credentials - securely handled
         self.snowflake_user = os.getenv('SNOWFLAKE_USER', config['snowflake']['user'])
         self.snowflake_password = os.getenv('SNOWFLAKE_PASSWORD', config['snowflake']['password'])
@@ -28,22 +37,40 @@ class DataLoader:
         self.snowflake_schema = config['snowflake']['schema']
         self.snowflake_role = config['snowflake']['role']
 
-        # Initialize Snowflake connection
-        self.conn = self.create_snowflake_connection()
-        self.cursor = self.conn.cursor()
+        # Snowflake connection is opened on first use
+        self._conn = None
+        self._cursor = None
 
         self.column_definition = ""
+        self.column_types = {}
+        self.new_column_types = {}
+        self.widened_column_types = {}
         self.column_context = None
 
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = self.create_snowflake_connection()
+        return self._conn
+
+    @property
+    def cursor(self):
+        if self._cursor is None:
+            self._cursor = self.conn.cursor()
+        return self._cursor
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.cursor.close()
-        self.conn.close()
+        if self._conn is not None:
+            self.cursor.close()
+            self.conn.close()
 
     def create_snowflake_connection(self):
         try:
+            # Imported on first connection; the connector loads pandas for its DataFrame helpers
+            import snowflake.connector
             return snowflake.connector.connect(
                 user=self.snowflake_user,
                 password=self.snowflake_password,
@@ -57,9 +84,9 @@ class DataLoader:
             logger.error("Failed to create Snowflake connection", exc_info=True)
             raise
 
-    def execute_query(self, query):
+    def execute_query(self, query, params=None):
         try:
-            self.cursor.execute(query)
+            self.cursor.execute(query, params)
             return self.cursor.sfqid
         except Exception as e:
             logger.error(f"Failed to execute query: {e}", exc_info=True)
@@ -77,8 +104,21 @@ class DataLoader:
         """
         Generate column definitions for the CREATE TABLE statement in Snowflake
         """
-        column_definitions = []
-        for column, data_type in zip(df.columns, df.dtypes):
+        column_definitions_str = self.format_col_definitions(self.infer_column_types(df))
+        logger.info("Column definitions successfully generated")
+        return column_definitions_str
+
+    def format_col_definitions(self, column_types):
+        return ', '.join(f'"{column}" {snowflake_data_type}' for column, snowflake_data_type in column_types.items())
+
+    def infer_column_types(self, df):
+        """
+        Map the columns of a DataFrame to Snowflake data types from their pandas dtypes
+        """
+        import pandas as pd
+
+        column_types = {}
+        for column, data_type in df.dtypes.items():
             snowflake_data_type = 'TEXT'  # default data type
             if pd.api.types.is_integer_dtype(data_type):
                 snowflake_data_type = 'NUMBER'
@@ -88,11 +128,8 @@ class DataLoader:
                 snowflake_data_type = 'TIMESTAMP'
             elif pd.api.types.is_string_dtype(data_type):
                 snowflake_data_type = 'TEXT'
-            column_definitions.append(f'"{column}" {snowflake_data_type}')
-
-        column_definitions_str = ', '.join(column_definitions)
-        logger.info("Column definitions successfully generated")
-        return column_definitions_str
+            column_types[column] = snowflake_data_type
+        return column_types
 
     def delete_folder_contents(self, folder_path):
         """
@@ -111,26 +148,42 @@ class DataLoader:
             logger.error(f"Error while deleting folder contents: {e}", exc_info=True)
             raise
 
+    def sanitise_text_columns(self, df):
+        """
+        Strip literal and actual tab/newline/carriage return sequences and double quotes
+        from the string values of text columns in a single vectorized pass per column
+        """
+        import pandas as pd
+
+        for col in df.columns:
+            if not (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])
+                    or isinstance(df[col].dtype, pd.CategoricalDtype)):
+                continue
+            values = df[col].astype(object)
+            kind = pd.api.types.infer_dtype(values, skipna=True)
+            if kind == 'string':
+                cleaned = values.str.replace(SPECIAL_CHARACTERS, '', regex=True)
+                df[col] = cleaned.where(cleaned.notna(), values)
+            elif kind in ('mixed', 'mixed-integer'):
+                # Strings mixed with other types; .str would turn the other values into NaN
+                pattern = re.compile(SPECIAL_CHARACTERS)
+                df[col] = values.map(lambda v: pattern.sub('', v) if isinstance(v, str) else v)
+            # Columns without any strings (dates, times, object ints, ...) are left untouched
+        return df
+
     def local_stage_df(self, df, file_path):
         """
         Preprocess the DataFrame and save it as a CSV file
         """
         try:
-            # Remove any special characters from the DataFrame
-            df.replace(to_replace=[r"\\t|\\n|\\r", "\\t|\\n|\\r",'"'], value=["","",""], regex=True, inplace=True)
-        except ValueError:
-            df.replace("\\n", "", inplace=True)
+            # Remove any special characters from the text columns, numeric columns are left untouched
+            self.sanitise_text_columns(df)
         except Exception as e:
             logger.error(f"Error while replacing special characters: {e}")
             raise
 
-        # Replace all numeric null values with 'NULL'
-        for col in df.columns:
-            # check if the column contains numeric values
-            if pd.api.types.is_numeric_dtype(df[col]):
-                # replace empty values with 'NULL'
-                df[col].fillna('NULL', inplace=True)
-
+        # Missing values in every column are written as "NULL" through na_rep,
+        # so numeric columns keep their dtype
         # Export the DataFrame to a CSV file
         try:
             df.to_csv(
@@ -154,6 +207,7 @@ class DataLoader:
         Clean the DataFrame: replace 'NaT' values, convert datetime columns to strings,
         and convert columns with more than one type to string
         """
+        import pandas as pd
 
         # Find columns containing 'NaT' values
         columns_with_nat = []
@@ -188,19 +242,33 @@ class DataLoader:
             # No CSV files were found
             return False
 
-    def process_flat_files(self, input_location, staging_location):
+    def qualified_table_name(self, name):
+        return f"{self.snowflake_database}.{self.snowflake_schema}.{name}_TABLE"
+
+    def process_flat_files(self, input_location, staging_location, name=None):
         """
-        Process Excel files: read the files, clean the data, and save it as CSV files
+        Process Excel files: read the files, clean the data, and save it as CSV files.
+        Column types are inferred across all files and merged with the types of a known
+        table (by name) from the schema registry, widening them where the files disagree.
         """
+        import pandas as pd
+        from src.utils import read_excel_cached
+
         self.staging_location = staging_location
+        known_types = self.schema_registry.get(self.qualified_table_name(name)) if name else {}
+        # Columns that are empty in a file say nothing about their type there
+        inferred_types, empty_types = {}, {}
         for file_name in os.listdir(input_location):
             file_path = os.path.join(input_location, file_name)
             try:
                 if (file_name.endswith('.xlsx') or file_name.endswith('.XLSX') or file_name.endswith('.xls')) and os.path.isfile(file_path):
-                    # Read the Excel file
-                    df = pd.read_excel(file_path)
+                    # Read the Excel file, through the conversion cache
+                    df = read_excel_cached(file_path)
                 elif file_name.endswith('.csv') and os.path.isfile(file_path):
                     df = pd.read_csv(file_path)
+                else:
+                    # Subfolders (e.g. archived extracts) and other files are not loaded
+                    continue
             except Exception as e:
                 logger.error(f"Error while reading the files in the input folder: {e}")
 
@@ -214,27 +282,61 @@ class DataLoader:
             stage_file_path = os.path.join(staging_location, f'{os.path.splitext(file_name)[0]}.csv')
             self.local_stage_df(df, stage_file_path)
 
-        self.column_definition = self.generate_col_definitions(df)
+            for column, data_type in self.infer_column_types(df).items():
+                if df[column].isna().all():
+                    empty_types[column] = widen_type(empty_types.get(column), data_type)
+                else:
+                    inferred_types[column] = widen_type(inferred_types.get(column), data_type)
+
+        column_types = dict(known_types)
+        for column, data_type in {**empty_types, **inferred_types}.items():
+            if column in known_types and column not in inferred_types:
+                continue
+            column_types[column] = widen_type(known_types.get(column), data_type)
+
+        self.column_types = column_types
+        self.new_column_types = {column: data_type for column, data_type in column_types.items() if column not in known_types}
+        self.widened_column_types = {column: data_type for column, data_type in column_types.items()
+                                     if column in known_types and data_type != known_types[column]}
+        self.column_definition = self.format_col_definitions(column_types)
 
         return None
 
 
-    def load_staged_files_to_snowflake(self, name):
+    def load_staged_files_to_snowflake(self, name, append=False):
         """
-        Load CSV files to Snowflake: generate column definitions, create the table,
-        and copy the data from the CSV files to the table
+        Load CSV files to Snowflake: create the table if it does not exist, add any new columns,
+        and copy the data from the CSV files to the table. Unless append is set, the existing
+        rows are truncated first so the table mirrors the input folder.
         """
         table_name = f'{name}_TABLE'
         stage_name = f'{name}_STAGE'
+        qualified_table_name = self.qualified_table_name(name)
 
         staging_location = self.staging_location
 
         if self.has_csv_files(folder_path=staging_location):
 
             col_def_str = self.column_definition
-            create_table_query = f""" CREATE OR REPLACE TABLE {self.snowflake_database+'.'+self.snowflake_schema+'.'+table_name} (
+            create_table_query = f""" CREATE TABLE IF NOT EXISTS {qualified_table_name} (
                 {col_def_str});"""
             self.execute_query(create_table_query)
+
+            # Columns not in the registry yet are added instead of recreating the table
+            for column, data_type in self.new_column_types.items():
+                self.execute_query(f'ALTER TABLE {qualified_table_name} ADD COLUMN IF NOT EXISTS "{column}" {data_type};')
+
+            if not append:
+                self.execute_query(f"TRUNCATE TABLE {qualified_table_name};")
+
+            # Snowflake cannot change NUMBER to FLOAT or TEXT in place; COPY matches columns by
+            # name, so the widened column is rebuilt under the same name
+            for column, data_type in self.widened_column_types.items():
+                logger.info(f'Widening "{column}" of {qualified_table_name} to {data_type}')
+                self.execute_query(f'ALTER TABLE {qualified_table_name} ADD COLUMN "{column}__widened" {data_type};')
+                self.execute_query(f'UPDATE {qualified_table_name} SET "{column}__widened" = "{column}"::{data_type};')
+                self.execute_query(f'ALTER TABLE {qualified_table_name} DROP COLUMN "{column}";')
+                self.execute_query(f'ALTER TABLE {qualified_table_name} RENAME COLUMN "{column}__widened" TO "{column}";')
                 
             internal_stage_handling = f"""CREATE OR REPLACE STAGE {self.snowflake_database+'.'+self.snowflake_schema+'.'+stage_name}"""
             self.execute_query(internal_stage_handling)
@@ -272,6 +374,10 @@ class DataLoader:
                     '''
             copy_qid = self.execute_query(copy_command)
 
+            self.schema_registry.update(qualified_table_name, self.column_types)
+            self.new_column_types = {}
+            self.widened_column_types = {}
+
             self.delete_folder_contents(folder_path=staging_location)
                         
             return True, put_qid, copy_qid
@@ -279,13 +385,13 @@ class DataLoader:
             raise FileNotFoundError('Specified folder does not have any CSV files staged')
         
 
-    def main_load(self, name, input_location, staging_location):
+    def main_load(self, name, input_location, staging_location, append=False):
             """
             Main function to load data: process Excel files and load CSV files to Snowflake
             """
             try:
                 # Process Excel files
-                self.process_flat_files(input_location=input_location,staging_location=staging_location)
+                self.process_flat_files(input_location=input_location,staging_location=staging_location,name=name)
                 print("Excel files processed successfully.")
                 
                 # Check if there are CSV files to load
@@ -294,7 +400,7 @@ class DataLoader:
                     return None
                 
                 # Load CSV files to Snowflake
-                success, pid, cid = self.load_staged_files_to_snowflake(name)
+                success, pid, cid = self.load_staged_files_to_snowflake(name, append=append)
                 if success:
                     print(f"CSV files loaded to Snowflake successfully \nPut ID: {pid} \nCopy ID: {cid}")
 
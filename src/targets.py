@@ -0,0 +1,87 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (articleCountry, provider, searchType) searched when none are configured. Every extract
+# made before targets were configurable searched this target only
+DEFAULT_TARGETS = [("AE", "22610", 1)]
+
+# Columns tagging output rows with the target they were extracted for
+TARGET_COLUMNS = ['articleCountry', 'provider', 'searchType']
+
+
+def parse_targets(value: str) -> list:
+    """
+    Parse targets written as "AE:22610:1, SA:22610:1"
+    """
+    targets = []
+    for item in value.split(','):
+        if item.strip():
+            country, provider, search_type = (part.strip() for part in item.split(':'))
+            targets.append((country, provider, int(search_type)))
+    return targets
+
+
+def format_target(target) -> str:
+    return ':'.join(str(part) for part in target)
+
+
+class TargetBackfill:
+    """
+    Targets whose whole listing catalogue has been extracted. New SKU detection only returns
+    SKUs that are new to the listings, so a target added to the config is backfilled once
+    with every listed SKU; SKUs that failed during a backfill are retried on the next run.
+    """
+    def __init__(self, state_path, initial_targets=DEFAULT_TARGETS):
+        self.state_path = state_path
+        self.completed = set(format_target(target) for target in initial_targets)
+        self.retry = {}
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.completed = set(state.get('completed_targets', []))
+            self.retry = state.get('retry_skus', {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'completed_targets': sorted(self.completed), 'retry_skus': self.retry}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def is_completed(self, target):
+        return format_target(target) in self.completed
+
+    def pending(self, targets):
+        """
+        Targets still to backfill, or with SKUs left to retry from their backfill
+        """
+        return [target for target in targets
+                if not self.is_completed(target) or self.retry.get(format_target(target))]
+
+    def skus_for(self, target, listed_skus):
+        """
+        SKUs to extract for a pending target: all listed SKUs for a new target, the
+        SKUs left to retry otherwise
+        """
+        if self.is_completed(target):
+            return list(self.retry.get(format_target(target), []))
+        return list(listed_skus)
+
+    def commit(self, target, failed_skus=()):
+        """
+        Mark a target as backfilled, keeping its failed SKUs for the next run
+        """
+        key = format_target(target)
+        self.completed.add(key)
+        if failed_skus:
+            self.retry[key] = sorted(failed_skus)
+        else:
+            self.retry.pop(key, None)
+        logger.info(f"Backfill of target {key} committed, {len(failed_skus)} SKUs left to retry")
+        self.save()
@@ -4,6 +4,8 @@ import requests
 import pandas as pd
 from tqdm import tqdm
 from src import project_root
+from src.decoding import ACCEPT_ENCODING, decode_response
+from src.utils import compact_articles, concat_articles
 from configparser import ConfigParser
 from datetime import datetime as dt
 
@@ -21,6 +23,7 @@ def extract_data_from_api(oem_list: list, config_path: str) -> None:
     payload = create_payload()
     
     with requests.Session() as session:
+        session.headers['Accept-Encoding'] = ACCEPT_ENCODING
         if process_oem_list(
             oem_list, session, URL, params, payload):
             logger.info("Extraction completed successfully")
@@ -78,7 +81,7 @@ def process_oem_sku(session, URL, params, payload, oem_sku, articles, no_respons
             break
 
 def handle_response(response, oem_sku, articles, no_response_list, page):
-    response_json = response.json()
+    response_json = decode_response(response)
     articles_data = response_json.get('articles', [])
     if articles_data:
         df_articles = pd.concat([
@@ -86,7 +89,7 @@ def handle_response(response, oem_sku, articles, no_response_list, page):
             pd.json_normalize(articles_data, 'genericArticles')
         ], axis=1)
         df_articles['OEM SKU'] = oem_sku
-        articles.append(df_articles)
+        articles.append(compact_articles(df_articles))
         return True
     elif page == 1:
         no_response_list.append({'OEM SKU': oem_sku})
@@ -96,7 +99,7 @@ def handle_response(response, oem_sku, articles, no_response_list, page):
 def save_data_in_batches(articles, no_response_list, problem_items, index):
     try:
         if articles:
-            save_to_csv(pd.concat(articles).reset_index(drop=True), "oem_matches", index)
+            save_to_csv(concat_articles(articles), "oem_matches", index)
         if no_response_list:
             save_to_csv(pd.DataFrame(no_response_list), "no_responses", index)
         if problem_items:
@@ -1,9 +1,13 @@
 import os
+import copy
 import logging
 import requests
 import pandas as pd
-from tqdm import tqdm
 from src import project_root
+from src.utils import compact_articles, concat_articles
+from src.resilience import HedgedPoster
+from src.targets import DEFAULT_TARGETS, TARGET_COLUMNS, parse_targets
+from src.decoding import ACCEPT_ENCODING, TransferStats, decode_response
 from configparser import ConfigParser
 from datetime import datetime as dt
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -11,32 +15,63 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 logger = logging.getLogger(__name__)
 data_stage_location= os.path.join(project_root, 'data')
 
-def extract_data_from_api(oem_list: list, config_path: str, batch_size=5000) -> None:
+# Bytes on the wire of all responses received by the workers
+transfer_stats = TransferStats()
+
+def extract_data_from_api(oem_list: list, config_path: str, batch_size=5000, targets=None, file_tag=None,
+                          output_dir=None) -> list:
+    """
+    Extract the SKUs for every target into output_dir (the project data folder by default);
+    returns the SKUs that failed for at least one target
+    """
     config = ConfigParser()
     logger.info(f"Config Path: {config_path}")
     config.read(config_path)
 
     URL = 'https://webservice.tecalliance.services/pegasus-3-0/services/TecdocToCatDLB.jsonEndpoint'
     params = {'api_key': config['techdoc']['api_key']}
-    payload = create_payload()
 
-    for start in range(0, len(oem_list), batch_size):
-        end = start + batch_size
-        logger.info(f"Dispatching elements between index {start} to {end}")
-        batch = oem_list[start:end]
-        art, no_resp, prob = process_batch(batch, URL, params, payload)
-        save_data_in_batches(art, no_resp, prob, end)
-        
+    if targets is None:
+        targets = parse_targets(config.get('techdoc', 'targets', fallback='')) or DEFAULT_TARGETS
+    payloads = {target: create_payload(*target) for target in targets}
+    logger.info(f"Extracting for targets {targets}")
+
+    # All target x SKU requests share one worker pool
+    max_workers = config.getint('techdoc', 'max_workers', fallback=10)
+
+    # Per request timeout, hedging of slow calls and circuit breaker settings
+    poster = HedgedPoster(
+        timeout=config.getfloat('techdoc', 'request_timeout', fallback=30),
+        hedge_percentile=config.getfloat('techdoc', 'hedge_percentile', fallback=95),
+        callers=max_workers,
+        failure_threshold=config.getint('techdoc', 'breaker_failure_threshold', fallback=5),
+        cooldown=config.getfloat('techdoc', 'breaker_cooldown', fallback=30),
+        headers={'Accept-Encoding': ACCEPT_ENCODING},
+    )
+    output_dir = output_dir or data_stage_location
+    failed_skus = set()
+    with poster, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(oem_list), batch_size):
+            end = start + batch_size
+            logger.info(f"Dispatching elements between index {start} to {end}")
+            batch = oem_list[start:end]
+            art, no_resp, prob = process_batch(batch, URL, params, payloads, poster, executor)
+            save_data_in_batches(art, no_resp, prob, end, file_tag, output_dir)
+            failed_skus.update(item['OEM SKU'] for item in prob)
+
+    transfer_stats.log()
+    if failed_skus:
+        logger.warning(f"Extraction failed for {len(failed_skus)} SKUs, they are written to the errors folder")
     logger.info("Extraction completed successfully")
-    return True
+    return sorted(failed_skus)
 
-def create_payload() -> dict:
+def create_payload(country="AE", provider="22610", search_type=1) -> dict:
     return {
         "getArticles": {
-            "articleCountry": "AE",
-            "provider": "22610",
+            "articleCountry": country,
+            "provider": provider,
             "searchQuery": "",
-            "searchType": 1,
+            "searchType": search_type,
             "lang": "en",
             "perPage": 100,
             "page": 1,
@@ -47,45 +82,52 @@ def create_payload() -> dict:
         }
     }
 
-def process_batch(batch, URL, params, payload):
+def process_batch(batch, URL, params, payloads, poster, executor):
     articles, no_response_list, problem_items = [], [], []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_sku = {executor.submit(process_oem_sku, URL, params, payload, sku): sku for sku in batch}
-        for future in as_completed(future_to_sku):
-            art, no_resp, prob = future.result()
-            articles.extend(art)
-            no_response_list.extend(no_resp)
-            problem_items.extend(prob)
+    future_to_sku = {
+        executor.submit(process_oem_sku, URL, params, payload, sku, poster, target): (target, sku)
+        for target, payload in payloads.items() for sku in batch
+    }
+    for future in as_completed(future_to_sku):
+        art, no_resp, prob = future.result()
+        articles.extend(art)
+        no_response_list.extend(no_resp)
+        problem_items.extend(prob)
     return articles, no_response_list, problem_items
 
 
-def process_oem_sku(URL, params, payload, oem_sku):
-    with requests.Session() as session:
-        articles, no_response_list, problem_items = [], [], []
-        page = 1
-        while True:
-            payload['getArticles']['searchQuery'] = oem_sku
-            payload['getArticles']['page'] = page
-            try:
-                response = session.post(url=URL, params=params, json=payload)
-                if response.status_code == 200:
-                    status = handle_response(response, oem_sku, articles, no_response_list, page)
-                    if status:
-                        page += 1
-                    else:
-                        break
+def process_oem_sku(URL, params, payload, oem_sku, poster, target=DEFAULT_TARGETS[0]):
+    # Each worker gets its own copy, the payload template is shared between threads
+    payload = copy.deepcopy(payload)
+    tags = dict(zip(TARGET_COLUMNS, target))
+    articles, no_response_list, problem_items = [], [], []
+    page = 1
+    while True:
+        payload['getArticles']['searchQuery'] = oem_sku
+        payload['getArticles']['page'] = page
+        try:
+            response = poster.post(URL, params, payload)
+            if response.status_code == 200:
+                status = handle_response(response, oem_sku, articles, no_response_list, page, tags)
+                if status:
+                    page += 1
                 else:
-                    logger.error(f"Error {response.status_code}: {response.text}")
-                    if page == 1:
-                        problem_items.append({'OEM SKU': oem_sku, 'Error': response.text})
                     break
-            except requests.RequestException as e:
-                logger.error(f"Request failed: {e}")
+            else:
+                logger.error(f"Error {response.status_code}: {response.text[:500]}", extra={'status_code': response.status_code})
+                # A failure on a later page leaves the SKU incomplete, so it is a problem item too
+                problem_items.append({'OEM SKU': oem_sku, 'Error': response.text, **tags})
                 break
-        return articles, no_response_list, problem_items
+        except requests.RequestException as e:
+            logger.error(f"Request failed: {e}", extra={'status_code': 'transport'})
+            problem_items.append({'OEM SKU': oem_sku, 'Error': str(e), **tags})
+            break
+    return articles, no_response_list, problem_items
 
-def handle_response(response, oem_sku, articles, no_response_list, page):
-    response_json = response.json()
+def handle_response(response, oem_sku, articles, no_response_list, page, tags=None):
+    tags = tags or {}
+    transfer_stats.record(response)
+    response_json = decode_response(response)
     articles_data = response_json.get('articles', [])
     if articles_data:
         df_articles = pd.concat([
@@ -93,25 +135,30 @@ def handle_response(response, oem_sku, articles, no_response_list, page):
             pd.json_normalize(articles_data, 'genericArticles')
         ], axis=1)
         df_articles['OEM SKU'] = oem_sku
-        articles.append(df_articles)
+        for column, value in tags.items():
+            df_articles[column] = value
+        articles.append(compact_articles(df_articles))
         return True
     elif page == 1:
-        no_response_list.append({'OEM SKU': oem_sku})
+        no_response_list.append({'OEM SKU': oem_sku, **tags})
         return False
     
-def save_data_in_batches(articles, no_response_list, problem_items, index):
+def save_data_in_batches(articles, no_response_list, problem_items, index, file_tag=None, output_dir=data_stage_location):
     try:
         if articles:
-            save_to_csv(pd.concat(articles).reset_index(drop=True), "oem_matches", index)
+            save_to_csv(concat_articles(articles), "oem_matches", index, file_tag, output_dir)
         if no_response_list:
-            save_to_csv(pd.DataFrame(no_response_list), "no_responses", index)
+            save_to_csv(pd.DataFrame(no_response_list), "no_responses", index, file_tag, output_dir)
         if problem_items:
-            save_to_csv(pd.DataFrame(problem_items), "errors", index)
+            save_to_csv(pd.DataFrame(problem_items), "errors", index, file_tag, output_dir)
     except Exception as e:
         logger.warning(f"Exception occurred during saving CSV: {e}")
 
-def save_to_csv(df, file_type, index):
+def save_to_csv(df, file_type, index, file_tag=None, output_dir=data_stage_location):
     start, end = max(0, index - 5000), index
     dt_stamp = dt.now().strftime("%Y%m%d_%H%M%S")
-    file_path = os.path.join(data_stage_location,file_type,f"{file_type}_{start}_{end}_{dt_stamp}.csv")
+    # Tag keeps file names unique when several workers write to the same folder
+    suffix = f"_{file_tag}" if file_tag else ""
+    os.makedirs(os.path.join(output_dir, file_type), exist_ok=True)
+    file_path = os.path.join(output_dir,file_type,f"{file_type}_{start}_{end}_{dt_stamp}{suffix}.csv")
     df.to_csv(file_path, index=False)
@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import logging
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+# Low cardinality text columns of the flattened getArticles pages, stored dictionary encoded
+CATEGORICAL_COLUMNS = ['matchType', 'description', 'mfrName', 'part_mfrName', 'genericArticleDescription', 'OEM SKU',
+                       'articleCountry', 'provider']
+
+# Identifier columns, kept as nullable integers so missing values do not turn them into floats
+ID_COLUMNS = ['mfrId', 'part_dataSupplierId', 'genericArticleId', 'legacyArticleId']
+
+
+def compact_articles(df):
+    """
+    Convert a flattened articles page to categorical text columns and nullable integer ids
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column in ID_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+    return df
+
+
+def concat_articles(frames):
+    """
+    Concatenate compacted article pages. Categorical columns are merged with
+    union_categoricals, once per column, so they stay categorical instead of
+    falling back to object in pd.concat
+    """
+    columns = list(dict.fromkeys(column for df in frames for column in df.columns))
+    categorical = [column for column in CATEGORICAL_COLUMNS if column in columns]
+
+    merged = pd.concat([df.drop(columns=[c for c in categorical if c in df.columns]) for df in frames],
+                       ignore_index=True)
+    for column in categorical:
+        parts = []
+        for df in frames:
+            if column in df.columns:
+                part = df[column].array
+            else:
+                part = pd.Categorical([None] * len(df))
+            # Pages where a column is entirely missing have empty float categories
+            if len(part.categories) == 0:
+                part = pd.Categorical([None] * len(part), categories=pd.Index([], dtype=object))
+            parts.append(part)
+        merged[column] = union_categoricals(parts, ignore_order=True)
+    return merged[columns]
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """
+    SHA-256 of a file, read in chunks
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_cache_index(index_path, index):
+    """
+    Write the conversion cache index through a temporary file, so readers never see a partial index
+    """
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path)
+
+
+def read_excel_cached(file_path, cache_dir=None, **kwargs):
+    """
+    Read an Excel file through a conversion cache. The first read parses the workbook
+    and stores the frame as a pickle keyed by the file content hash and read arguments;
+    later reads of an unchanged file load the pickle and skip xlsx parsing entirely.
+    The content hash is only recomputed when the file mtime or size changes.
+    """
+    if cache_dir is None:
+        from src import project_root
+        cache_dir = os.path.join(project_root, 'data', 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    index_path = os.path.join(cache_dir, 'index.json')
+    index = {}
+    if os.path.isfile(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+    abs_path = os.path.abspath(file_path)
+    stat = os.stat(abs_path)
+    entry = index.get(abs_path)
+    if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+        digest = entry['hash']
+    else:
+        digest = file_digest(abs_path)
+        pickles = entry.get('pickles', []) if entry else []
+        if entry and entry['hash'] != digest:
+            # The content changed, pickles of the previous version are never read again
+            for stale_path in pickles:
+                if os.path.isfile(stale_path):
+                    os.remove(stale_path)
+            pickles = []
+        entry = index[abs_path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': digest, 'pickles': pickles}
+        save_cache_index(index_path, index)
+
+    options = json.dumps(kwargs, sort_keys=True, default=str)
+    key = hashlib.sha256(f"{digest}{options}".encode('utf-8')).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(abs_path))[0]}-{key}.pkl")
+
+    if os.path.isfile(cache_path):
+        logger.info(f"Reading {file_path} from conversion cache {cache_path}")
+        return pd.read_pickle(cache_path)
+
+    # pandas opens xlsx workbooks with openpyxl in read-only mode
+    df = pd.read_excel(abs_path, **kwargs)
+    df.to_pickle(cache_path)
+    entry.setdefault('pickles', []).append(cache_path)
+    save_cache_index(index_path, index)
+    logger.info(f"Converted {file_path} to {cache_path}")
+    return df
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import socket
+import shutil
+import sqlite3
+import logging
+import argparse
+import threading
+from configparser import ConfigParser
+from contextlib import contextmanager
+from src import project_root
+from src.logger_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = os.path.join(project_root, 'config', 'config.ini')
+DEFAULT_DB_PATH = os.path.join(project_root, 'data', 'workqueue', 'queue.db')
+DEFAULT_OUTPUT_DIR = os.path.join(project_root, 'data')
+
+
+class WorkQueue:
+    """
+    SKU chunk queue backed by a SQLite file, shared by a coordinator and any number of
+    workers (threads, processes or hosts on a shared mount). Workers lease chunks for a
+    limited time; leases that are not completed in time are handed out again.
+    """
+    def __init__(self, db_path=DEFAULT_DB_PATH, lease_seconds=1800, max_attempts=3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    skus TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    failed_skus TEXT,
+                    targets TEXT
+                )""")
+            # Queue files created before failed SKUs and chunk targets were recorded
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(chunks)")]
+            for column in ('failed_skus', 'targets'):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} TEXT")
+
+    @contextmanager
+    def connect(self):
+        # isolation_level=None so transactions are controlled explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, oem_list, chunk_size=1000, targets=None):
+        """
+        Split the SKU list into chunks and add them to the queue; returns the id of the first chunk.
+        Chunks are extracted for the given targets, or for the workers' configured targets if None.
+        """
+        chunks = [json.dumps(list(oem_list[start:start + chunk_size])) for start in range(0, len(oem_list), chunk_size)]
+        chunk_targets = json.dumps([list(target) for target in targets]) if targets else None
+        with self.connect() as conn:
+            first_id = None
+            conn.execute("BEGIN IMMEDIATE")
+            for chunk in chunks:
+                chunk_id = conn.execute("INSERT INTO chunks (skus, targets) VALUES (?, ?)", (chunk, chunk_targets)).lastrowid
+                first_id = first_id or chunk_id
+            conn.execute("COMMIT")
+        logger.info(f"Enqueued {len(oem_list)} SKUs in {len(chunks)} chunks")
+        return first_id
+
+    def lease(self, worker):
+        """
+        Lease the next pending or abandoned chunk; returns (chunk_id, skus, targets) or None when nothing is available
+        """
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._lease(conn, worker, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        targets = [tuple(target) for target in json.loads(row[2])] if row[2] else None
+        return row[0], json.loads(row[1]), targets
+
+    def _lease(self, conn, worker, now):
+        # Abandoned chunks that used up their attempts are given up on
+        conn.execute("""
+            UPDATE chunks SET status = 'failed', error = 'lease expired too many times'
+            WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, self.max_attempts))
+        row = conn.execute("""
+            SELECT id, skus, targets FROM chunks
+            WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+            ORDER BY id LIMIT 1""", (now,)).fetchone()
+        if row is not None:
+            conn.execute("""
+                UPDATE chunks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = ?""", (worker, now + self.lease_seconds, row[0]))
+        return row
+
+    def complete(self, chunk_id, worker, failed_skus=()):
+        """
+        Mark a leased chunk as done, recording the SKUs the extraction failed on;
+        returns False if the lease had been re-issued to another worker
+        """
+        with self.connect() as conn:
+            updated = conn.execute("""
+                UPDATE chunks SET status = 'done', lease_expires = NULL, failed_skus = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'""", (json.dumps(list(failed_skus)), chunk_id, worker)).rowcount
+        return updated == 1
+
+    def renew(self, chunk_id, worker):
+        """
+        Extend the lease on a chunk; returns False if it had been re-issued to another worker
+        """
+        with self.connect() as conn:
+            updated = conn.execute("""
+                UPDATE chunks SET lease_expires = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'""", (time.time() + self.lease_seconds, chunk_id, worker)).rowcount
+        return updated == 1
+
+    def release(self, chunk_id, worker, error):
+        """
+        Give a chunk back after a failure so it can be retried, or fail it after max_attempts
+        """
+        with self.connect() as conn:
+            conn.execute("""
+                UPDATE chunks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    worker = NULL, lease_expires = NULL, error = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'""", (self.max_attempts, str(error), chunk_id, worker))
+
+    def counts(self, min_id=0):
+        """
+        Number of chunks per status, optionally only from chunk min_id onwards
+        """
+        with self.connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM chunks WHERE id >= ? GROUP BY status", (min_id,)).fetchall())
+
+    def failed_skus(self, min_id=0):
+        """
+        SKUs that failed inside completed chunks, optionally only from chunk min_id onwards
+        """
+        with self.connect() as conn:
+            rows = conn.execute("SELECT failed_skus FROM chunks WHERE id >= ? AND status = 'done'", (min_id,)).fetchall()
+        return sorted(sku for row in rows if row[0] for sku in json.loads(row[0]))
+
+    def wait_until_drained(self, min_id=0, poll_seconds=30):
+        """
+        Block until no chunk is pending or leased; returns the final status counts
+        """
+        while True:
+            counts = self.counts(min_id)
+            if not counts.get('pending') and not counts.get('leased'):
+                return counts
+            logger.info(f"Waiting for workers: {counts}")
+            time.sleep(poll_seconds)
+
+
+def heartbeat(queue, chunk_id, worker, stop):
+    """
+    Renew the lease on a chunk every third of the lease time until stop is set
+    """
+    while not stop.wait(queue.lease_seconds / 3):
+        try:
+            if not queue.renew(chunk_id, worker):
+                logger.warning(f"Worker {worker} lost the lease on chunk {chunk_id}")
+                return
+        except sqlite3.Error as e:
+            logger.warning(f"Worker {worker} could not renew the lease on chunk {chunk_id}: {e}")
+
+
+def publish(attempt_dir, output_dir):
+    """
+    Move the extract files of a completed attempt into the output folders
+    """
+    for file_type in os.listdir(attempt_dir):
+        os.makedirs(os.path.join(output_dir, file_type), exist_ok=True)
+        for file_name in os.listdir(os.path.join(attempt_dir, file_type)):
+            os.replace(os.path.join(attempt_dir, file_type, file_name), os.path.join(output_dir, file_type, file_name))
+    shutil.rmtree(attempt_dir)
+
+
+def run_worker(queue, config_path, worker=None, output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Lease chunks and extract them into output_dir until the queue is empty. When workers
+    run on several hosts output_dir must be on the mount the coordinator loads from.
+
+    The lease is renewed while a chunk is extracted. Each attempt writes to its own folder
+    under output_dir/.attempts and is only published once the chunk is marked complete, so
+    a chunk that was re-issued to another worker never lands in output_dir twice.
+    """
+    from src.techdocpull_mt import extract_data_from_api
+
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    processed = 0
+    while True:
+        leased = queue.lease(worker)
+        if leased is None:
+            break
+        chunk_id, skus, targets = leased
+        logger.info(f"Worker {worker} leased chunk {chunk_id} with {len(skus)} SKUs")
+
+        # Same mount as output_dir, so publishing is a rename
+        attempt_dir = os.path.join(output_dir, '.attempts', f"chunk{chunk_id}-{worker}")
+        shutil.rmtree(attempt_dir, ignore_errors=True)
+        stop = threading.Event()
+        renewer = threading.Thread(target=heartbeat, args=(queue, chunk_id, worker, stop), daemon=True)
+        renewer.start()
+        try:
+            failed_skus = extract_data_from_api(oem_list=skus, config_path=config_path, batch_size=len(skus),
+                                                targets=targets, file_tag=f"chunk{chunk_id}", output_dir=attempt_dir)
+        except Exception as e:
+            logger.error(f"Worker {worker} failed on chunk {chunk_id}: {e}", exc_info=True)
+            queue.release(chunk_id, worker, e)
+            shutil.rmtree(attempt_dir, ignore_errors=True)
+            continue
+        finally:
+            stop.set()
+            renewer.join()
+
+        if not queue.complete(chunk_id, worker, failed_skus):
+            logger.warning(f"Lease on chunk {chunk_id} was re-issued before worker {worker} completed it, discarding its extract")
+            shutil.rmtree(attempt_dir, ignore_errors=True)
+            continue
+        if os.path.isdir(attempt_dir):
+            publish(attempt_dir, output_dir)
+        processed += 1
+    logger.info(f"Worker {worker} finished after {processed} chunks")
+    return processed
+
+
+if __name__ == "__main__":
+    workqueue_logger = setup_logging("workqueue", queued=True)
+
+    parser = argparse.ArgumentParser(description="Distributed SKU extraction work queue")
+    parser.add_argument('command', choices=['worker', 'status'])
+    parser.add_argument('--db', help="queue file, [workqueue] db_path of the config by default")
+    parser.add_argument('--config', default=CONFIG_FILE)
+    parser.add_argument('--output-dir', help="extract folder, [workqueue] output_dir of the config by default")
+    parser.add_argument('--worker-id')
+    args = parser.parse_args()
+
+    config = ConfigParser()
+    config.read(args.config)
+    db_path = args.db or config.get('workqueue', 'db_path', fallback='') or DEFAULT_DB_PATH
+    output_dir = args.output_dir or config.get('workqueue', 'output_dir', fallback='') or DEFAULT_OUTPUT_DIR
+
+    queue = WorkQueue(db_path=db_path, lease_seconds=config.getfloat('workqueue', 'lease_seconds', fallback=1800))
+    if args.command == 'worker':
+        run_worker(queue, config_path=args.config, worker=args.worker_id, output_dir=output_dir)
+    else:
+        print(queue.counts())